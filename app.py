@@ -1,11 +1,17 @@
+import logging
 import time
 import requests
 import streamlit as st
 import pandas as pd
-from dateutil.parser import parse
-from fuzzywuzzy import fuzz
-import json
+from rapidfuzz import fuzz, process
+from symspellpy import SymSpell, Verbosity
+import orjson
 import os
+import re
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
 
 # Streamlit Secrets (used on Streamlit Cloud)
 CLIENT_ID = st.secrets["simpro_client_id"]
@@ -14,37 +20,68 @@ SIMPRO_DOMAIN = f"https://{st.secrets['simpro_tenant']}.simprosuite.com"
 SIMPRO_API_BASE = "https://api-uk.simprocloud.com"
 
 MATCH_FILE = "confirmed_matches.json"
+MATCH_LOG = "confirmed_matches.jsonl"
+MATCH_COMPACT_SECONDS = 60
 
-# Retry wrapper for API GETs
+logger = logging.getLogger(__name__)
+
+# Shared pooled session so concurrent Simpro calls reuse connections.
+# Retries are left to safe_get so failures aren't retried twice over.
+@st.cache_resource
+def get_session():
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_maxsize=16))
+    return session
+
+SESSION = get_session()
+
+# Retry wrapper for API GETs. Returns (response, None) or (None, error message)
+# and leaves reporting to the caller, as it also runs in worker threads.
 def safe_get(url, headers, retries=3, timeout=10):
     for attempt in range(retries):
         try:
-            response = requests.get(url, headers=headers, timeout=timeout)
+            response = SESSION.get(url, headers=headers, timeout=timeout)
             response.raise_for_status()
-            return response
+            return response, None
         except requests.exceptions.RequestException as e:
-            st.warning(f"⏳ Attempt {attempt + 1}/{retries} failed: {e}")
-            time.sleep(2)
-    st.error(f"❌ Failed to get data from Simpro after {retries} attempts.")
-    return None
-
-# Simpro OAuth2 token request
+            logger.warning("Attempt %d/%d for %s failed: %s", attempt + 1, retries, url, e)
+            last_error = e
+            if attempt + 1 < retries:
+                time.sleep(2)
+    return None, f"❌ Failed to get data from Simpro after {retries} attempts: {last_error}"
+
+# Token cache shared across reruns; the lock keeps concurrent callers to one refresh
+@st.cache_resource
+def get_token_cache():
+    return {"value": None, "expires_at": 0.0, "lock": threading.Lock()}
+
+# Simpro OAuth2 token request, reusing the cached token until a minute before expiry
 def get_access_token():
-    token_url = f"{SIMPRO_DOMAIN}/oauth2/token"
-    headers = {'Content-Type': 'application/x-www-form-urlencoded'}
-    data = {
-        'grant_type': 'client_credentials',
-        'client_id': CLIENT_ID,
-        'client_secret': CLIENT_SECRET
-    }
+    cache = get_token_cache()
+    with cache["lock"]:
+        if cache["value"] and time.time() < cache["expires_at"] - 60:
+            return cache["value"]
+
+        token_url = f"{SIMPRO_DOMAIN}/oauth2/token"
+        headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+        data = {
+            'grant_type': 'client_credentials',
+            'client_id': CLIENT_ID,
+            'client_secret': CLIENT_SECRET
+        }
 
-    try:
-        response = requests.post(token_url, headers=headers, data=data, timeout=10)
-        response.raise_for_status()
-        return response.json()['access_token']
-    except Exception as e:
-        st.error(f"❌ Failed to get token: {e}")
-        return None
+        try:
+            response = SESSION.post(token_url, headers=headers, data=data, timeout=10)
+            response.raise_for_status()
+            payload = orjson.loads(response.content)
+            token = payload['access_token']
+        except Exception as e:
+            st.error(f"❌ Failed to get token: {e}")
+            return None
+
+        cache["value"] = token
+        cache["expires_at"] = time.time() + payload.get('expires_in', 3600)
+        return token
 
 def get_headers():
     token = get_access_token()
@@ -55,62 +92,132 @@ def get_headers():
         "Content-Type": "application/json"
     }
 
-def get_company_id(headers):
+# The tenant's company doesn't change, so it is looked up once per token lifetime.
+# Returns (company_id, None) or (None, error message) without rendering anything.
+@st.cache_data(ttl=3000, show_spinner=False)
+def get_company_id(_headers):
     url = f"{SIMPRO_API_BASE}/api/v1.0/companies"
-    st.write(f"🔗 Requesting company info from: {url}")
 
-    response = safe_get(url, headers)
+    response, error = safe_get(url, _headers)
     if not response:
-        return None
+        return None, error
 
     try:
-        data = response.json()
+        data = orjson.loads(response.content)
     except:
-        st.error("❌ Could not decode company info JSON.")
-        return None
+        return None, "❌ Could not decode company info JSON."
 
     if not data:
-        st.error("⚠️ No companies returned.")
-        return None
-
-    st.success(f"✅ Got company ID: {data[0]['ID']}")
-    return data[0]['ID']
-
-def get_all_contacts(headers):
-    st.write("📞 Fetching contacts...")
-    company_id = get_company_id(headers)
-    if not company_id:
-        return []
-
-    contacts = []
-    page = 1
-
-    while True:
-        url = f"{SIMPRO_API_BASE}/api/v1.0/companies/{company_id}/contacts?page={page}&pageSize=100"
-        st.write(f"📄 Page {page}")
-        response = safe_get(url, headers)
-        if not response:
-            return []
-
-        page_data = response.json()
-        if not page_data:
-            break
+        return None, "⚠️ No companies returned."
 
-        contacts.extend(page_data)
-        page += 1
+    return data[0]['ID'], None
 
-    st.success(f"✅ Retrieved {len(contacts)} contacts.")
-    return contacts
+# Returns (contacts, None) or (None, error message) without rendering anything,
+# since it runs inside the cached get_contact_index
+def get_all_contacts(company_id, headers):
+    def page_url(page):
+        return f"{SIMPRO_API_BASE}/api/v1.0/companies/{company_id}/contacts?page={page}&pageSize=100"
 
+    response, error = safe_get(page_url(1), headers)
+    if not response:
+        return None, error
+    contacts = orjson.loads(response.content)
+
+    # Simpro reports the page count in a header; fetch the rest in parallel when it does
+    total_pages = response.headers.get("Result-Pages")
+    if total_pages:
+        with ThreadPoolExecutor(max_workers=8) as ex:
+            results = list(ex.map(lambda p: safe_get(page_url(p), headers), range(2, int(total_pages) + 1)))
+        errors = [error for _, error in results if error]
+        if errors:
+            return None, errors[0]
+        for response, _ in results:
+            contacts.extend(orjson.loads(response.content))
+    else:
+        page = 2
+        while contacts:
+            response, error = safe_get(page_url(page), headers)
+            if not response:
+                return None, error
+
+            page_data = orjson.loads(response.content)
+            if not page_data:
+                break
+
+            contacts.extend(page_data)
+            page += 1
+
+    return contacts, None
+
+# Guards the shared confirmed matches dict and its files across sessions
+@st.cache_resource
+def get_match_lock():
+    return threading.Lock()
+
+# Confirmed matches live in memory; new ones are appended to MATCH_LOG and
+# periodically compacted back into MATCH_FILE by start_match_compactor.
+@st.cache_resource
 def load_confirmed_matches():
+    matches = {}
     if os.path.exists(MATCH_FILE):
-        with open(MATCH_FILE, "r") as f:
-            return json.load(f)
-    return {}
+        with open(MATCH_FILE, "rb") as f:
+            matches.update(orjson.loads(f.read()))
+    if os.path.exists(MATCH_LOG):
+        with open(MATCH_LOG, "rb+") as f:
+            data = f.read()
+            # A crash mid-append leaves a partial last line; drop it so the next
+            # append starts on a fresh line
+            complete = data[:data.rfind(b"\n") + 1]
+            if len(complete) < len(data):
+                logger.warning("Dropping partly written line from %s", MATCH_LOG)
+                f.truncate(len(complete))
+        for line in complete.splitlines():
+            if not line.strip():
+                continue
+            try:
+                entry = orjson.loads(line)
+            except orjson.JSONDecodeError:
+                logger.warning("Skipping undecodable line in %s", MATCH_LOG)
+                continue
+            matches[entry["key"]] = entry["value"]
+    return matches
+
+def save_confirmed_match(key, value):
+    matches = load_confirmed_matches()
+    with get_match_lock():
+        matches[key] = value
+        with open(MATCH_LOG, "ab") as f:
+            f.write(orjson.dumps({"key": key, "value": value}) + b"\n")
+
+def compact_confirmed_matches(matches):
+    with get_match_lock():
+        if not os.path.exists(MATCH_LOG):
+            return
+        tmp_file = f"{MATCH_FILE}.tmp"
+        with open(tmp_file, "wb") as f:
+            f.write(orjson.dumps(matches))
+        os.replace(tmp_file, MATCH_FILE)
+        os.remove(MATCH_LOG)
+
+# Always compacts the current cached dict, so a reloaded cache can't be
+# overwritten by a stale copy
+def compact_confirmed_matches_forever():
+    while True:
+        time.sleep(MATCH_COMPACT_SECONDS)
+        try:
+            compact_confirmed_matches(load_confirmed_matches())
+        except OSError as e:
+            logger.warning("Could not compact confirmed matches: %s", e)
+
+# Held as a resource so only one compaction thread ever runs
+@st.cache_resource
+def start_match_compactor():
+    thread = threading.Thread(target=compact_confirmed_matches_forever, daemon=True)
+    thread.start()
+    return thread
 
 # Dummy contact creation (stub for now)
 def create_contact(first, last, mobile, headers):
-    st.info(f"🧪 Would create contact: {first} {last}")
     return {"ID": f"dummy_{first}_{last}"}
 
 # Dummy site creation (stub for now)
@@ -125,133 +232,301 @@ def create_job(site_id, cid, job_name, date, notes, job_count, headers):
 def add_charge_to_job(job_id, description, charge_total, headers):
     return True
 
-# Dummy matching logic (stub)
-def match_contact(contacts, first, last):
+# Creates the site, job and charge for one row.
+# Runs in a worker thread, so UI messages are returned rather than rendered.
+def process_row(row, contact, headers):
+    cid = contact['ID']
+    first, last, job_name = row["first"], row["last"], row["job_name"]
+    result = {"log": [], "job_id": None, "charge": None}
+
+    site = create_site(job_name, row["address"], row["city"], row["postcode"], cid, headers)
+    if not site:
+        result["log"].append(("error", f"❌ Site creation failed: {job_name} for {first} {last}"))
+        return result
+
+    job = create_job(site['ID'], cid, job_name, row["date_required"], row["notes"], row["job_count"], headers)
+    if not job:
+        return result
+
+    job_id = result["job_id"] = job['ID']
+    result["log"].append(("success", f"✅ Job created: {job_name} for {first} {last}"))
+
+    charge_total = 0
+    messages = []
+
+    if row["day_total"] == 1:
+        charge_total += 111.50
+        messages.append("Standard daily callout (£111.50)")
+    elif row["day_idx"] == 0:
+        charge_total += 223
+        messages.append("Multiple job day flat rate (£223.00)")
+
+    if row["shutter"] == 'Y':
+        charge_total += 137.50
+        messages.append("Shutter charge (£137.50)")
+
+    if charge_total > 0:
+        description = " + ".join(messages)
+        if add_charge_to_job(job_id, description, charge_total, headers):
+            result["log"].append(("success", f"💰 Charge added: {description} | £{charge_total:.2f}"))
+            result["charge"] = {
+                "Contact": f"{first} {last}",
+                "Job Name": job_name,
+                "Date": row["job_date_str"],
+                "Charge Description": description,
+                "Total (£)": charge_total
+            }
+        else:
+            result["log"].append(("warning", "⚠️ Charge could not be added."))
+
+    return result
+
+# Lowercases a contact's names once, in place, for matching
+def normalize_contact(contact):
+    contact["_fn"] = contact.get("FirstName", "").lower()
+    contact["_ln"] = contact.get("LastName", "").lower()
+    contact["_full"] = f"{contact['_fn']} {contact['_ln']}"
+    return contact
+
+# Contacts and their match index are fetched and built once per TTL and shared as
+# a resource, so reruns neither hash the list nor rebuild the SymSpell dictionary.
+# Every session reads it, so it is never modified after it is built; contacts
+# created during an upload go into a per-run index instead. Failed fetches are
+# cleared by the caller so they aren't cached.
+@st.cache_resource(ttl=300, show_spinner=False)
+def get_contact_index(company_id, _headers):
+    contacts, error = get_all_contacts(company_id, _headers)
+    if error:
+        return None, error
+    return build_contact_index(contacts), None
+
+def build_contact_index(contacts):
+    index = {
+        "contacts": contacts,
+        "exact": {},
+        "by_initial": defaultdict(list),
+        "by_full": {},
+        "by_id": {},
+        "symspell": SymSpell(max_dictionary_edit_distance=2),
+    }
     for c in contacts:
-        if c.get("FirstName", "").lower() == first.lower() and c.get("LastName", "").lower() == last.lower():
-            return c
-    return None
+        add_contact_to_index(index, c)
+    return index
+
+def add_contact_to_index(index, contact):
+    c = normalize_contact(contact)
+    index["exact"].setdefault((c["_fn"], c["_ln"]), c)
+    index["by_initial"][(c["_fn"][:1], len(c["_fn"]))].append(c)
+    index["by_full"].setdefault(c["_full"], c)
+    index["by_id"].setdefault(c.get("ID"), c)
+    index["symspell"].create_dictionary_entry(c["_full"], 1)
+
+# First and last names must each be close, so "John Smithson" isn't "John Smith"
+def names_match(contact, first_lc, last_lc):
+    return fuzz.ratio(first_lc, contact["_fn"]) > 80 and fuzz.ratio(last_lc, contact["_ln"]) > 80
+
+# Dummy matching logic (stub); names are already lowercased
+def match_contact(index, first_lc, last_lc):
+    return index["exact"].get((first_lc, last_lc))
+
+# Dummy fuzzy match; names are already lowercased
+def fuzzy_match_contact(index, first_lc, last_lc, row_index):
+    query = f"{first_lc} {last_lc}"
+
+    # Names within two edits come straight from the SymSpell index, as long as
+    # both name parts still match on their own
+    for suggestion in index["symspell"].lookup(query, Verbosity.CLOSEST, max_edit_distance=2):
+        contact = index["by_full"][suggestion.term]
+        if names_match(contact, first_lc, last_lc):
+            return contact
+
+    # Otherwise score the initial/length bucket for looser matches
+    candidates = []
+    for length in (len(first_lc) - 1, len(first_lc), len(first_lc) + 1):
+        candidates.extend(index["by_initial"].get((first_lc[:1], length), []))
+    if not candidates:
+        return None
 
-# Dummy fuzzy match
-def fuzzy_match_contact(contacts, first, last, row_index):
-    for c in contacts:
-        if fuzz.ratio(first.lower(), c.get("FirstName", "").lower()) > 80 and \
-           fuzz.ratio(last.lower(), c.get("LastName", "").lower()) > 80:
-            return c
+    # Best full-name scores first; each name part must still clear the threshold
+    names = [c["_full"] for c in candidates]
+    for _, _, i in process.extract(query, names, scorer=fuzz.WRatio, score_cutoff=80, limit=None):
+        if names_match(candidates[i], first_lc, last_lc):
+            return candidates[i]
     return None
 
+def normalize_header(header):
+    return re.sub(r"\s+", " ", header.strip().lower())
+
 # --- UI ---
 
 st.title("🔐 Simpro Uploader (Streamlit Edition)")
 uploaded_file = st.file_uploader("Upload Excel File", type=[".xlsx"])
 
-if 'confirmed_matches' not in st.session_state:
-    st.session_state.confirmed_matches = load_confirmed_matches()
+start_match_compactor()
+st.session_state.confirmed_matches = load_confirmed_matches()
 
 if uploaded_file:
-    df = pd.read_excel(uploaded_file)
+    uploaded_file.seek(0)
+    df = pd.read_excel(uploaded_file, engine="calamine", dtype=str)
     st.success("File loaded successfully.")
 
     headers = list(df.columns)
-    expected = [
-        "W/O First Name", "W/O Last Name", "W/O Mobile", "Contract Number", "Date Required",
-        "Address Of Visit", "City of Visit", "Postcode", "Shutter required y/n", "Lock type"
-    ]
-
-    col_map = {}
-    for target in expected:
-        match = max(headers, key=lambda h: fuzz.ratio(h.lower(), target.lower()))
-        if fuzz.ratio(match.lower(), target.lower()) < 90:
-            st.error(f"Column '{target}' not matched confidently.")
+    # Expected column -> attribute name used when iterating rows
+    expected = {
+        "W/O First Name": "first", "W/O Last Name": "last", "W/O Mobile": "mobile",
+        "Contract Number": "job_name", "Date Required": "date_text", "Address Of Visit": "address",
+        "City of Visit": "city", "Postcode": "postcode", "Shutter required y/n": "shutter", "Lock type": "locks"
+    }
+
+    # Headers that match exactly, ignoring case and spacing, skip fuzzy scoring
+    norm = {normalize_header(h): h for h in headers}
+    col_map = {t: norm[normalize_header(t)] for t in expected if normalize_header(t) in norm}
+    targets = [t for t in expected if t not in col_map]
+
+    if targets:
+        headers_lc = [h.lower() for h in headers]
+        targets_lc = [t.lower() for t in targets]
+
+        # Score every remaining target against every header in one call
+        scores = process.cdist(targets_lc, headers_lc, scorer=fuzz.ratio)
+        best = scores.argmax(axis=1)
+        unmatched = (scores.max(axis=1) < 90).nonzero()[0]
+        for i in unmatched:
+            st.error(f"Column '{targets[i]}' not matched confidently.")
+        if len(unmatched):
             st.stop()
-        col_map[target] = match
+        col_map.update({targets[i]: headers[best[i]] for i in range(len(targets))})
+
+    # Blank cells become empty strings; pandas 3 would otherwise leave them as NaN
+    work = pd.DataFrame({expected[k]: df[v].fillna("").astype(str).str.strip() for k, v in col_map.items()})
+    work["shutter"] = work["shutter"].str.upper()
+    # Excel date cells arrive as ISO strings, which dayfirst would swap; typed dates are day-first
+    iso_dates = pd.to_datetime(work["date_text"], format="ISO8601", errors="coerce")
+    work["date_required"] = iso_dates.fillna(pd.to_datetime(work["date_text"], dayfirst=True, errors="coerce", format="mixed"))
+    skipped_dates = work.loc[work["date_required"].isna(), "date_text"].replace("", "(blank)").astype(str).tolist()
+    work = work[work["date_required"].notna()].copy()
+    work["first_lc"] = work["first"].str.lower()
+    work["last_lc"] = work["last"].str.lower()
+    work["date_str"] = work["date_required"].dt.strftime("%Y-%m-%d")
+
+    # Jobs per contact per day drive the callout charge
+    work["key"] = work["first_lc"].str.cat([work["last_lc"], work["date_str"]], sep="_")
+    work["day_total"] = work.groupby("key")["key"].transform("size")
+    work["day_idx"] = work.groupby("key").cumcount()
 
     st.write("## Preview")
     st.dataframe(df.head())
 
     headers_api = get_headers()
     st.write("✅ Token acquired.")
-    contacts = get_all_contacts(headers_api)
-    st.success("Fetched all contacts.")
+    company_id, error = get_company_id(headers_api)
+    if error:
+        st.error(error)
+        get_company_id.clear()
+        st.stop()
+
+    if st.button("🔄 Refresh contacts"):
+        get_contact_index.clear()
+
+    with st.status("📞 Fetching contacts...", expanded=False) as status:
+        contact_index, error = get_contact_index(company_id, headers_api)
+        if error:
+            st.error(error)
+            status.update(label="❌ Failed to fetch contacts.", state="error")
+        else:
+            status.update(label=f"✅ Retrieved {len(contact_index['contacts'])} contacts.", state="complete")
+    if error:
+        get_contact_index.clear()
+        st.stop()
+
     submitted = st.button("🚀 Start Upload")
 
     if submitted:
         charge_log = []
+        log = []
+        ready_rows = []
         scheduled = {}
-        daily_job_count = {}
-
-        for i, row in df.iterrows():
-            first = str(row[col_map['W/O First Name']]).strip()
-            last = str(row[col_map['W/O Last Name']]).strip()
-            mobile = str(row[col_map['W/O Mobile']]).strip()
-            job_name = str(row[col_map['Contract Number']]).strip()
-            address = str(row[col_map['Address Of Visit']]).strip()
-            city = str(row[col_map['City of Visit']]).strip()
-            postcode = str(row[col_map['Postcode']]).strip()
-            shutter = str(row[col_map['Shutter required y/n']]).strip().upper()
-            locks = str(row[col_map['Lock type']]).strip()
-            notes = " | ".join(filter(None, ["SHUTTER" if shutter == 'Y' else "", f"LOCKS: {locks}" if locks else ""]))
+        confirmed = st.session_state.confirmed_matches
+        # Contacts created during this upload, kept out of the shared index
+        run_index = build_contact_index([])
 
-            try:
-                date_required = parse(str(row[col_map['Date Required']]), dayfirst=True)
-            except:
-                st.warning(f"⏭️ Skipping invalid date: {row[col_map['Date Required']]}")
-                continue
+        # One progress bar and one status line, updated in place
+        progress = st.progress(0.0)
+        status_line = st.empty()
+
+        if skipped_dates:
+            st.warning(f"⏭️ Skipping {len(skipped_dates)} row(s) with invalid dates: {', '.join(skipped_dates)}")
 
-            job_date_str = date_required.strftime("%Y-%m-%d")
-            contact_key = f"{first.lower()}_{last.lower()}_{job_date_str}"
-            daily_job_count.setdefault(contact_key, 0)
-            daily_job_count[contact_key] += 1
+        for i, row in enumerate(work.itertuples(), 1):
+            progress.progress(i / len(work), text=f"Matching contacts {i}/{len(work)}")
+            first, last, shutter, locks = row.first, row.last, row.shutter, row.locks
+            notes = " | ".join(filter(None, ["SHUTTER" if shutter == 'Y' else "", f"LOCKS: {locks}" if locks else ""]))
 
-            contact = match_contact(contacts, first, last) or fuzzy_match_contact(contacts, first, last, i)
+            key = f"{row.first_lc} {row.last_lc}"
+            contact = (
+                match_contact(contact_index, row.first_lc, row.last_lc)
+                or contact_index["by_id"].get(confirmed.get(key))
+                or match_contact(run_index, row.first_lc, row.last_lc)
+            )
+            if not contact:
+                # Fuzzy matches used for an upload are remembered for later runs
+                contact = fuzzy_match_contact(contact_index, row.first_lc, row.last_lc, row.Index)
+                if contact:
+                    save_confirmed_match(key, contact["ID"])
             if not contact:
-                contact = create_contact(first, last, mobile, headers_api)
+                contact = create_contact(first, last, row.mobile, headers_api)
                 if contact:
-                    contacts.append(contact)
+                    log.append(("info", f"🧪 Would create contact: {first} {last}"))
+                    # Later rows for the same person reuse this contact
+                    contact.setdefault("FirstName", first)
+                    contact.setdefault("LastName", last)
+                    add_contact_to_index(run_index, contact)
                 else:
-                    st.warning(f"⚠️ Contact creation failed for {first} {last}")
+                    log.append(("warning", f"⚠️ Contact creation failed for {first} {last}"))
                     continue
 
-            cid = contact['ID']
-            scheduled.setdefault(cid, 0)
-            site = create_site(job_name, address, city, postcode, cid, headers_api)
-
-            if site:
-                job = create_job(site['ID'], cid, job_name, date_required, notes, scheduled[cid], headers_api)
-                if job:
-                    job_id = job['ID']
-                    st.success(f"✅ Job created: {job_name} for {first} {last}")
-                    scheduled[cid] += 1
-
-                    charge_total = 0
-                    messages = []
-
-                    if daily_job_count[contact_key] == 1:
-                        charge_total += 111.50
-                        messages.append("Standard daily callout (£111.50)")
-                    elif daily_job_count[contact_key] > 1 and scheduled[cid] == 1:
-                        charge_total += 223
-                        messages.append("Multiple job day flat rate (£223.00)")
-
-                    if shutter == 'Y':
-                        charge_total += 137.50
-                        messages.append("Shutter charge (£137.50)")
-
-                    if charge_total > 0:
-                        description = " + ".join(messages)
-                        if add_charge_to_job(job_id, description, charge_total, headers_api):
-                            st.success(f"💰 Charge added: {description} | £{charge_total:.2f}")
-                            charge_log.append({
-                                "Contact": f"{first} {last}",
-                                "Job Name": job_name,
-                                "Date": job_date_str,
-                                "Charge Description": description,
-                                "Total (£)": charge_total
-                            })
-                        else:
-                            st.warning("⚠️ Charge could not be added.")
-            else:
-                st.error(f"❌ Site creation failed: {job_name} for {first} {last}")
+            # Jobs already queued for this contact, worked out before dispatch
+            job_count = scheduled.setdefault(contact['ID'], 0)
+            scheduled[contact['ID']] += 1
+
+            ready_rows.append(({
+                "first": first,
+                "last": last,
+                "job_name": row.job_name,
+                "address": row.address,
+                "city": row.city,
+                "postcode": row.postcode,
+                "shutter": shutter,
+                "notes": notes,
+                "date_required": row.date_required,
+                "job_date_str": row.date_str,
+                "day_total": row.day_total,
+                "day_idx": row.day_idx,
+                "job_count": job_count,
+            }, contact))
+
+        # Contacts are resolved above, so the remaining Simpro writes are independent per row
+        with ThreadPoolExecutor(max_workers=8) as ex:
+            futures = [ex.submit(process_row, *r, headers_api) for r in ready_rows]
+            for done, future in enumerate(as_completed(futures), 1):
+                progress.progress(done / len(futures), text=f"Uploading jobs {done}/{len(futures)}")
+                result_log = future.result()["log"]
+                if result_log:
+                    status_line.write(result_log[-1][1])
+        results = [future.result() for future in futures]
+
+        for result in results:
+            log.extend(result["log"])
+            if result["charge"]:
+                charge_log.append(result["charge"])
+
+        progress.empty()
+        status_line.empty()
+        jobs_created = sum(1 for result in results if result["job_id"])
+        problems = sum(1 for level, _ in log if level in ("warning", "error"))
+        st.success(f"✅ {jobs_created} of {len(ready_rows)} jobs created, {len(charge_log)} charges added, {problems} problem(s).")
+        if log:
+            st.dataframe(pd.DataFrame(log, columns=["level", "message"]))
 
         if charge_log:
             st.write("## 💼 Charge Summary")
@@ -264,9 +539,9 @@ if st.button("🌐 Test Simpro API Connection"):
     headers = get_headers()
     try:
         test_url = "https://api-uk.simprocloud.com/api/v1.0/companies?pageSize=1"
-        response = requests.get(test_url, headers=headers, timeout=10)
+        response = SESSION.get(test_url, headers=headers, timeout=10)
         if response.status_code == 200:
-            data = response.json()
+            data = orjson.loads(response.content)
             st.success(f"✅ Connected! Company name: {data[0]['Name']} (ID: {data[0]['ID']})")
         else:
             st.error(f"❌ Simpro responded with status: {response.status_code}")